@@ -1,36 +1,62 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from pathlib import Path
+import numpy as np
+import altair as alt
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numba import njit
+
+from prepare_data import (
+    ENRICHED_PATH,
+    TREND_SUMMARY_PATH,
+    SEASONS,
+    compute_trends
+)
 
 # =========================
 # LOAD DATA
 # =========================
+# Kolom turunan sudah dihitung oleh prepare_data.py
+COLUMNS = ['PM2.5', 'station', 'year', 'hour', 'day_of_week', 'season', 'date']
+
+# Satu DataFrame read-only per proses server, tanpa salinan per rerun
+@st.cache_resource(show_spinner=False)
 def load_data():
-    BASE_DIR = Path(__file__).resolve().parent
-    data_path = BASE_DIR / "main_data.parquet"
+    # Memory-map file agar beberapa worker berbagi page cache yang sama
+    with pa.memory_map(str(ENRICHED_PATH), 'r') as source:
+        table = pq.read_table(
+            source,
+            columns=COLUMNS,
+            use_threads=True,
+            use_pandas_metadata=True
+        )
+        return table.to_pandas()
 
-    df = pd.read_parquet(data_path)
+# Upper bound (inclusive) of each PM2.5 category, in µg/m³
+PM25_BINS = np.array([15, 25, 150, np.inf])
+PM25_LABELS = ['Good', 'Moderate', 'Unhealthy', 'Very Unhealthy']
 
-    df['year'] = df.index.year
-    df['hour'] = df.index.hour
-    df['day_of_week'] = df.index.dayofweek
-    df['month'] = df.index.month
+DAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-    return df
+@njit(cache=True)
+def daily_category_counts(keys, pm25, n_keys, bins):
+    # Rata-rata per key (stasiun, hari), lalu hitung jumlah hari per kategori
+    sums = np.zeros(n_keys)
+    counts = np.zeros(n_keys, dtype=np.int64)
+    for i in range(len(keys)):
+        # Lewati NaN, sama seperti skipna pada groupby().mean()
+        if pm25[i] == pm25[i]:
+            sums[keys[i]] += pm25[i]
+            counts[keys[i]] += 1
 
-def get_season(month):
-    if month in [12, 1, 2]:
-        return 'Winter'
-    elif month in [3, 4, 5]:
-        return 'Spring'
-    elif month in [6, 7, 8]:
-        return 'Summer'
-    else:
-        return 'Autumn'
+    dist = np.zeros(len(bins), dtype=np.int64)
+    for k in range(n_keys):
+        if counts[k] > 0:
+            dist[np.searchsorted(bins, sums[k] / counts[k])] += 1
+
+    return dist
 
 df = load_data()
-df['season'] = df['month'].apply(get_season)
 
 # =========================
 # PAGE CONFIG
@@ -73,20 +99,151 @@ with st.sidebar:
     )
 
     # Filter stasiun
-    stations = sorted(df['station'].unique())
+    all_stations = sorted(df['station'].unique())
     selected_stations = st.multiselect(
         "Select Stations",
-        stations,
-        default=stations
+        all_stations,
+        default=all_stations
     )
 
 # =========================
 # APPLY FILTER (GLOBAL)
 # =========================
-df_filtered = df[
-    (df['year'].between(selected_years[0], selected_years[1])) &
-    (df['station'].isin(selected_stations))
-]
+def filter_data(year_range, stations):
+    # Satu mask NumPy + satu take untuk semua tab
+    year = df['year'].to_numpy()
+    station_codes = df['station'].cat.codes.to_numpy()
+    selected_codes = df['station'].cat.categories.get_indexer(stations)
+
+    mask = (
+        (year >= year_range[0]) & (year <= year_range[1]) &
+        np.isin(station_codes, selected_codes)
+    )
+
+    return df.take(np.flatnonzero(mask))
+
+# =========================
+# AGGREGATES (CACHED PER FILTER)
+# =========================
+def compute_station_stats(df_filtered, years):
+    # Matriks (tahun x stasiun) dari satu bincount dengan key gabungan
+    station_codes = df_filtered['station'].cat.codes.to_numpy()
+    stations = df_filtered['station'].cat.categories
+    n_stations = len(stations)
+    year_offsets = (df_filtered['year'].to_numpy() - years[0]).astype(np.int64)
+    keys = year_offsets * n_stations + station_codes
+
+    # NaN dilewati seperti skipna pada groupby().mean()
+    pm25 = df_filtered['PM2.5'].to_numpy()
+    valid = np.isfinite(pm25)
+    keys, pm25 = keys[valid], pm25[valid]
+
+    shape = (len(years), n_stations)
+    sums = np.bincount(
+        keys, weights=pm25, minlength=shape[0] * shape[1]
+    ).reshape(shape)
+    counts = np.bincount(keys, minlength=shape[0] * shape[1]).reshape(shape)
+
+    # Rata-rata per stasiun dari matriks yang sama; hanya 5 teratas diurutkan
+    station_counts = counts.sum(axis=0)
+    observed = np.flatnonzero(station_counts)
+    means = sums.sum(axis=0)[observed] / station_counts[observed]
+
+    k = min(5, len(means))
+    top_idx = np.argpartition(-means, k - 1)[:k]
+    top_idx = top_idx[np.argsort(-means[top_idx])]
+    top_codes = observed[top_idx]
+
+    top5 = pd.Series(means[top_idx], index=stations[top_codes], name='PM2.5')
+
+    year_idx, top_pos = np.nonzero(counts[:, top_codes])
+    cells = (year_idx, top_codes[top_pos])
+    yearly_top5 = pd.DataFrame({
+        'year': years[year_idx],
+        'station': stations[top_codes][top_pos],
+        'PM2.5': sums[cells] / counts[cells]
+    })
+
+    return yearly_top5, top5
+
+def compute_quality_dist(df_filtered):
+    # Satu key integer per (stasiun, hari): code * n_days + day_offset.
+    # Station-major, sesuai urutan baris, agar akumulasi berurutan di memori
+    station_codes = df_filtered['station'].cat.codes.to_numpy().astype(np.int64)
+    n_stations = len(df_filtered['station'].cat.categories)
+    days = df_filtered['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    day_offsets = days - days.min()
+    n_days = day_offsets.max() + 1
+    keys = station_codes * n_days + day_offsets
+
+    dist = daily_category_counts(
+        keys,
+        df_filtered['PM2.5'].to_numpy(),
+        n_stations * n_days,
+        PM25_BINS
+    )
+
+    return pd.Series(dist, index=PM25_LABELS)
+
+# Ringkasan tren untuk data tanpa filter, dihitung oleh prepare_data.py
+@st.cache_resource(show_spinner=False)
+def load_trend_summary():
+    summary = pd.read_parquet(TREND_SUMMARY_PATH)
+    buckets = {
+        bucket_type: group.set_index('bucket_key')['mean_pm25']
+        for bucket_type, group in summary.groupby('bucket_type')
+    }
+
+    seasonal = buckets['season']
+    seasonal.index = np.array(SEASONS)[seasonal.index]
+
+    return (
+        buckets['all'].iloc[0],
+        buckets['year'],
+        buckets['hour'],
+        buckets['day_of_week'],
+        seasonal.reindex(SEASONS)
+    )
+
+@st.cache_data(show_spinner=False)
+def get_aggregates(year_range, stations):
+    df_filtered = filter_data(year_range, stations)
+
+    years = np.arange(year_min, year_max + 1)
+
+    if year_range == (year_min, year_max) and list(stations) == all_stations:
+        trends = load_trend_summary()
+    else:
+        trends = compute_trends(df_filtered, years)
+
+    return {
+        'trends': trends,
+        'station_stats': compute_station_stats(df_filtered, years),
+        'quality_dist': compute_quality_dist(df_filtered)
+    }
+
+def trend_chart(series, title, x_title, sort='ascending'):
+    # Sumbu x ordinal agar urutan tahun/jam/hari/musim tetap terjaga
+    data = series.rename_axis('x').reset_index(name='PM2.5')
+
+    return (
+        alt.Chart(data, title=title)
+        .mark_line(point=True)
+        .encode(
+            x=alt.X('x:O', title=x_title, sort=sort),
+            y=alt.Y('PM2.5:Q', title="PM2.5 (µg/m³)"),
+            tooltip=[alt.Tooltip('PM2.5:Q', format='.1f')]
+        )
+    )
+
+# Tanpa stasiun terpilih tidak ada data untuk diagregasi
+if not selected_stations:
+    st.info("Select at least one station")
+    st.stop()
+
+# Cache keys must be hashable and independent of selection order
+filter_key = (tuple(selected_years), tuple(sorted(selected_stations)))
+aggregates = get_aggregates(*filter_key)
 
 # =========================
 # TABS
@@ -99,91 +256,68 @@ tab1, tab2, tab3 = st.tabs([
 
 # TAB 1 — TIME TREND (FILTERED)
 
-with tab1:
+@st.fragment
+def render_time_trend(trends):
     st.subheader("PM2.5 Trends Over Time")
 
+    (
+        pm25_mean,
+        pm25_yearly,
+        pm25_hourly,
+        pm25_daily,
+        pm25_seasonal
+    ) = trends
+
     st.metric(
         "Average PM2.5 (Filtered)",
-        f"{df_filtered['PM2.5'].mean():.2f} µg/m³"
+        f"{pm25_mean:.2f} µg/m³"
     )
 
-    pm25_yearly = df_filtered.groupby('year')['PM2.5'].mean()
-    pm25_hourly = df_filtered.groupby('hour')['PM2.5'].mean()
-    pm25_daily = df_filtered.groupby('day_of_week')['PM2.5'].mean()
-    pm25_seasonal = (
-        df_filtered.groupby('season')['PM2.5']
-        .mean()
-        .reindex(['Spring', 'Summer', 'Autumn', 'Winter'])
+    row1 = st.columns(2)
+    row2 = st.columns(2)
+
+    row1[0].altair_chart(
+        trend_chart(pm25_yearly, "Annual Average PM2.5", "Year")
+    )
+    row1[1].altair_chart(
+        trend_chart(pm25_hourly, "Hourly Average PM2.5", "Hour")
+    )
+    row2[0].altair_chart(
+        trend_chart(
+            pm25_daily.rename(index=dict(enumerate(DAY_LABELS))),
+            "Daily Average PM2.5", "Day", sort=DAY_LABELS
+        )
+    )
+    row2[1].altair_chart(
+        trend_chart(pm25_seasonal, "Seasonal Average PM2.5", "Season", sort=SEASONS)
     )
 
-    fig, axes = plt.subplots(2, 2, figsize=(14, 8))
-
-    # Hourly
-    axes[0, 1].plot(pm25_hourly.index, pm25_hourly.values, marker='o')
-    axes[0, 1].set_title("Hourly Average PM2.5")
-    axes[0, 1].set_xlabel("Hour")
-    axes[0, 1].set_xticks(range(0, 24))
-    axes[0, 1].grid(True, alpha=0.4)
-
-    # Daily
-    axes[1, 0].plot(pm25_daily.index, pm25_daily.values, marker='o')
-    axes[1, 0].set_title("Daily Average PM2.5")
-    axes[1, 0].set_xticks(range(7))
-    axes[1, 0].set_xticklabels(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
-    axes[1, 0].grid(True, alpha=0.4)
-
-    # Yearly
-    axes[0, 0].plot(pm25_yearly.index, pm25_yearly.values, marker='o')
-    axes[0, 0].set_title("Annual Average PM2.5")
-    axes[0, 0].set_xlabel("Year")
-    axes[0, 0].grid(True, alpha=0.4)
-    axes[0, 0].set_xticks(pm25_yearly.index)
-
-    # Seasonal
-    axes[1, 1].plot(pm25_seasonal.index, pm25_seasonal.values, marker='o')
-    axes[1, 1].set_title("Seasonal Average PM2.5")
-    axes[1, 1].grid(True, alpha=0.4)
-
-    plt.tight_layout()
-    st.pyplot(fig)
+with tab1:
+    render_time_trend(aggregates['trends'])
 
 # TAB 2 — BY STATION (FILTERED)
 
-with tab2:
+@st.fragment
+def render_by_station(station_stats):
     st.subheader("Stations with Highest Pollution")
 
-    yearly_station = (
-        df_filtered.groupby(['year', 'station'])['PM2.5']
-        .mean()
-        .reset_index()
-    )
-
-    top5 = (
-        df_filtered.groupby('station')['PM2.5']
-        .mean()
-        .sort_values(ascending=False)
-        .head(5)
-    )
+    yearly_top5, top5 = station_stats
 
     # ---------- TREND ----------
-    fig1, ax1 = plt.subplots(figsize=(5, 3))
-
-    for station in top5.index:
-        d = yearly_station[yearly_station['station'] == station]
-        ax1.plot(d['year'], d['PM2.5'], marker='o', label=station)
-
-    ax1.set_title("Annual PM2.5 Trend (Top 5 Stations)", fontsize=7, pad=6)
-    ax1.set_xlabel("Year", fontsize=6)
-    ax1.set_ylabel("PM2.5 (µg/m³)", fontsize=6)
-    years = sorted(pm25_yearly.index.unique())
-    ax1.set_xticks(years)
-    ax1.set_xticklabels(years)
-    ax1.tick_params(axis='both', labelsize=6)
-    ax1.grid(True, linestyle='--', alpha=0.4)
-
-    ax1.legend(ncol=3, fontsize=5)
-
-    st.pyplot(fig1, use_container_width=False)
+    st.altair_chart(
+        alt.Chart(yearly_top5, title="Annual PM2.5 Trend (Top 5 Stations)")
+        .mark_line(point=True)
+        .encode(
+            x=alt.X('year:O', title="Year"),
+            y=alt.Y('PM2.5:Q', title="PM2.5 (µg/m³)"),
+            color=alt.Color(
+                'station:N',
+                sort=list(top5.index),
+                legend=alt.Legend(title=None, orient='bottom', columns=3)
+            ),
+            tooltip=['station', 'year', alt.Tooltip('PM2.5:Q', format='.1f')]
+        )
+    )
 
     st.markdown("---")
 
@@ -191,38 +325,16 @@ with tab2:
     col1, col2 = st.columns([3, 1])
 
     with col1:
-        fig2, ax2 = plt.subplots(figsize=(4, 3))
-
-        bars = ax2.barh(
-            top5.index,
-            top5.values,
-            color='firebrick'
+        st.markdown("**Top 5 Stations by Average PM2.5**")
+        st.bar_chart(
+            top5,
+            horizontal=True,
+            sort='-PM2.5',
+            color='#b22222',
+            x_label="PM2.5 (µg/m³)",
+            y_label=""
         )
 
-        ax2.set_title(
-            "Top 5 Stations by Average PM2.5",
-            fontsize=6,
-            pad=6
-        )
-        ax2.set_xlabel("PM2.5 (µg/m³)", fontsize=6)
-
-        ax2.tick_params(axis='x', labelsize=6)
-        ax2.tick_params(axis='y', labelsize=6)
-
-        ax2.grid(axis='x', linestyle='--', alpha=0.4)
-
-        for bar in bars:
-            ax2.text(
-                bar.get_width() + max(top5.values) * 0.01,
-                bar.get_y() + bar.get_height() / 2,
-                f"{bar.get_width():.1f}",
-                va='center',
-                fontsize=6
-            )
-
-        plt.tight_layout()
-        st.pyplot(fig2, use_container_width=False)
-
     with col2:
         st.markdown("### 📊 Ranking")
         for i, (station, value) in enumerate(top5.items(), 1):
@@ -232,56 +344,48 @@ with tab2:
                 unsafe_allow_html=True
             )
 
+with tab2:
+    render_by_station(aggregates['station_stats'])
+
 # TAB 3 — AIR QUALITY (FILTERED)
 
-with tab3:
+@st.fragment
+def render_air_quality(dist):
     st.subheader("Air Quality Based on Health Standards")
 
-    def categorize_pm25(pm25):
-        if pm25 <= 15:
-            return 'Good'
-        elif pm25 <= 25:
-            return 'Moderate'
-        elif pm25 <= 150:
-            return 'Unhealthy'
-        else:
-            return 'Very Unhealthy'
-
-    df_filtered['date'] = df_filtered.index.date
-
-    daily = (
-        df_filtered.groupby(['station', 'date'])['PM2.5']
-        .mean()
-        .reset_index()
-    )
-    daily['category'] = daily['PM2.5'].apply(categorize_pm25)
-
-    dist = daily['category'].value_counts().reindex(
-        ['Good', 'Moderate', 'Unhealthy', 'Very Unhealthy']
-    )
-
-    fig, ax = plt.subplots(figsize=(5, 5))
     colors = {
-    'Good': 'green',
-    'Moderate': 'yellow',
-    'Unhealthy': 'red',
-    'Very Unhealthy': 'black'
-  }
-
-    wedges, texts, autotexts = ax.pie(
-        dist.values,
-        labels=dist.index,
-        autopct='%1.1f%%',
-        startangle=90,
-        colors=[colors[cat] for cat in dist.index],
-        textprops={'fontsize': 8}
+        'Good': 'green',
+        'Moderate': 'yellow',
+        'Unhealthy': 'red',
+        'Very Unhealthy': 'black'
+    }
+
+    dist_df = dist.rename_axis('category').reset_index(name='days')
+    dist_df['order'] = np.arange(len(dist_df))
+    dist_df['share'] = dist_df['days'] / dist_df['days'].sum()
+
+    donut = alt.Chart(dist_df).encode(
+        theta=alt.Theta('days:Q', stack=True),
+        order=alt.Order('order:Q'),
+        color=alt.Color(
+            'category:N',
+            sort=PM25_LABELS,
+            scale=alt.Scale(domain=list(colors), range=list(colors.values())),
+            legend=alt.Legend(title=None)
+        ),
+        tooltip=['category', 'days', alt.Tooltip('share:Q', format='.1%')]
     )
 
-    for i, autotext in enumerate(autotexts):
-        if colors[dist.index[i]] == 'black':
-            autotext.set_color('white')
-
-    ax.set_title("Air Quality Distribution", fontsize=10, pad=6)
-    ax.axis('equal')
+    st.altair_chart(
+        (
+            donut.mark_arc(innerRadius=70, outerRadius=140) +
+            donut.mark_text(radius=165, size=12).encode(
+                text=alt.Text('share:Q', format='.1%'),
+                color=alt.value('#2c3e50')
+            )
+        ).properties(title="Air Quality Distribution", width=400, height=400),
+        width='content'
+    )
 
-    st.pyplot(fig, use_container_width=False)
+with tab3:
+    render_air_quality(aggregates['quality_dist'])
@@ -0,0 +1,115 @@
+import pandas as pd
+import numpy as np
+from pathlib import Path
+
+# =========================
+# PATHS
+# =========================
+BASE_DIR = Path(__file__).resolve().parent
+SOURCE_PATH = BASE_DIR / "main_data.parquet"
+ENRICHED_PATH = BASE_DIR / "main_data_enriched.parquet"
+TREND_SUMMARY_PATH = BASE_DIR / "trend_summary.parquet"
+
+# =========================
+# SEASON MAPPING
+# =========================
+# Index = month (1-12), index 0 unused
+_SEASON_LUT = np.array([
+    '', 'Winter', 'Winter', 'Spring', 'Spring', 'Spring',
+    'Summer', 'Summer', 'Summer', 'Autumn', 'Autumn', 'Autumn', 'Winter'
+])
+SEASONS = ['Spring', 'Summer', 'Autumn', 'Winter']
+
+# =========================
+# ENRICH DATA
+# =========================
+def enrich(df):
+    df = df.copy()
+
+    # Kolom turunan dari DatetimeIndex, disimpan dengan dtype kecil
+    df['year'] = df.index.year.astype('int16')
+    df['hour'] = df.index.hour.astype('int8')
+    df['day_of_week'] = df.index.dayofweek.astype('int8')
+    df['month'] = df.index.month.astype('int8')
+    df['date'] = df.index.normalize()
+    df['season'] = pd.Categorical(
+        _SEASON_LUT[df['month'].to_numpy()],
+        categories=SEASONS
+    )
+
+    # float32 cukup untuk rata-rata PM2.5 dan separuh ukuran float64
+    df['PM2.5'] = df['PM2.5'].astype('float32')
+
+    # Nama stasiun sebagai kode integer, bukan string Python
+    df['station'] = df['station'].astype('category')
+
+    # Baris tiap stasiun bersebelahan dan urut waktu, agar agregasi per
+    # stasiun membaca memori secara berurutan
+    df = df.sort_values(['station', df.index.name], kind='mergesort')
+
+    return df
+
+# =========================
+# TREND AGGREGATES
+# =========================
+def mean_by_bin(keys, values, labels):
+    # Small integer keys: one bincount for sums, one for counts, no hashing.
+    # NaN dilewati seperti skipna pada groupby().mean()
+    valid = np.isfinite(values)
+    keys, values = keys[valid], values[valid]
+
+    sums = np.bincount(keys, weights=values, minlength=len(labels))
+    counts = np.bincount(keys, minlength=len(labels))
+    observed = counts > 0
+
+    return pd.Series(sums[observed] / counts[observed], index=labels[observed])
+
+def compute_trends(df, years):
+    pm25 = df['PM2.5'].to_numpy()
+
+    pm25_mean = np.nanmean(pm25, dtype=np.float64)
+    pm25_yearly = mean_by_bin(
+        df['year'].to_numpy() - years[0], pm25, years
+    )
+    pm25_hourly = mean_by_bin(
+        df['hour'].to_numpy(), pm25, np.arange(24)
+    )
+    pm25_daily = mean_by_bin(
+        df['day_of_week'].to_numpy(), pm25, np.arange(7)
+    )
+    pm25_seasonal = mean_by_bin(
+        df['season'].cat.codes.to_numpy(), pm25, np.array(SEASONS)
+    ).reindex(SEASONS)
+
+    return pm25_mean, pm25_yearly, pm25_hourly, pm25_daily, pm25_seasonal
+
+def build_trend_summary(df):
+    years = np.arange(df['year'].min(), df['year'].max() + 1)
+    pm25_mean, yearly, hourly, daily, seasonal = compute_trends(df, years)
+
+    # Musim disimpan sebagai indeks di SEASONS agar bucket_key tetap integer
+    buckets = {
+        'all': pd.Series([pm25_mean]),
+        'year': yearly,
+        'hour': hourly,
+        'day_of_week': daily,
+        'season': seasonal.set_axis(np.arange(len(SEASONS)))
+    }
+
+    return pd.concat([
+        pd.DataFrame({
+            'bucket_type': bucket_type,
+            'bucket_key': series.index.astype('int16'),
+            'mean_pm25': series.to_numpy()
+        })
+        for bucket_type, series in buckets.items()
+    ], ignore_index=True)
+
+if __name__ == "__main__":
+    df = enrich(pd.read_parquet(SOURCE_PATH))
+    df.to_parquet(ENRICHED_PATH, index=True)
+    print(f"Saved {len(df):,} rows to {ENRICHED_PATH.name}")
+
+    summary = build_trend_summary(df)
+    summary.to_parquet(TREND_SUMMARY_PATH, index=False)
+    print(f"Saved {len(summary)} trend buckets to {TREND_SUMMARY_PATH.name}")